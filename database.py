@@ -3,7 +3,8 @@ import os
 from typing import Optional, Tuple, List
 from datetime import datetime, timedelta
 from logger import logger
-from utils import encrypt_api_key, decrypt_api_key
+from utils import encrypt_api_key, get_user_api_key, invalidate_api_key
+from db_utils import add_indexes
 
 class Database:
     """Класс для работы с базой данных SQLite"""
@@ -78,6 +79,9 @@ class Database:
                 ''')
             
             conn.commit()
+            
+            # Индексы для выборок и очистки устаревших данных
+            add_indexes(conn)
             logger.info("Структура базы данных проверена и обновлена")
             
         except sqlite3.Error as e:
@@ -105,6 +109,7 @@ class Database:
                 (user_id, encrypted_key)
             )
             conn.commit()
+            invalidate_api_key(user_id)
             return True
         except sqlite3.Error:
             return False
@@ -129,8 +134,8 @@ class Database:
                 return None
                 
             encrypted_key, is_banned, ban_reason = result
-            # Дешифруем ключ перед возвратом
-            api_key = decrypt_api_key(encrypted_key) if encrypted_key else None
+            # Дешифруем ключ перед возвратом (с кэшированием)
+            api_key = get_user_api_key(user_id, encrypted_key) if encrypted_key else None
             return (api_key, bool(is_banned), ban_reason)
         finally:
             conn.close()
@@ -148,6 +153,7 @@ class Database:
                 (user_id,)
             )
             conn.commit()
+            invalidate_api_key(user_id)
             return True
         except sqlite3.Error:
             return False
@@ -526,5 +532,31 @@ class Database:
         finally:
             conn.close()
 
+    def mark_feedback_list_as_read(self, feedback_ids: List[int]) -> bool:
+        """
+        Отметить несколько отзывов как прочитанные одним подготовленным запросом
+        
+        Args:
+            feedback_ids (List[int]): ID отзывов
+        """
+        if not feedback_ids:
+            return True
+            
+        conn = self._get_connection()
+        c = conn.cursor()
+        
+        try:
+            c.executemany(
+                'UPDATE feedback SET is_read = 1 WHERE id = ?',
+                [(feedback_id,) for feedback_id in feedback_ids]
+            )
+            conn.commit()
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при обновлении статуса отзывов: {e}")
+            return False
+        finally:
+            conn.close()
+
 # Создаем глобальный экземпляр базы данных
 db = Database() 
\ No newline at end of file
@@ -61,6 +61,12 @@ def add_indexes(conn: sqlite3.Connection) -> None:
             ON users(last_activity)
         ''')
         
+        # Индекс для поиска неактивных пользователей без API-ключа
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_users_activity_api_key 
+            ON users(last_activity, api_key)
+        ''')
+        
         # Индекс для поиска забаненных пользователей
         conn.execute('''
             CREATE INDEX IF NOT EXISTS idx_users_banned 
@@ -73,6 +79,12 @@ def add_indexes(conn: sqlite3.Connection) -> None:
             ON violations(user_id, violation_date)
         ''')
         
+        # Индекс для поиска отзывов пользователя
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_feedback_user_id 
+            ON feedback(user_id)
+        ''')
+        
         # Индекс для поиска отзывов по статусу
         conn.execute('''
             CREATE INDEX IF NOT EXISTS idx_feedback_status 
@@ -1,7 +1,8 @@
 from aiogram import types
 from aiogram.dispatcher import Dispatcher, FSMContext
 from aiogram.utils import executor
-from aiogram.dispatcher.filters import Command
+from aiogram.utils.markdown import escape_md
+from aiogram.dispatcher.filters import Command, Text
 from logger import logger, log_moderation, log_violation, log_ban
 from database import db
 from api_client import OpenRouterClient
@@ -13,7 +14,7 @@ from datetime import datetime, timedelta
 from cache import Cache
 from hints import hint_system  # Добавляем импорт системы подсказок
 from states import FeedbackStates
-from validators import validator, format_markdown_message  # Добавляем импорт
+from validators import format_markdown_message  # Добавляем импорт
 from exceptions import ApiError, ValidationError, RateLimitError  # Добавляем импорт исключений
 from formatting import (
     format_message, format_code, format_error,
@@ -61,6 +62,32 @@ HELP_TEXT = """
 ℹ️ Нарушения автоматически сбрасываются через 24 часа
 """
 
+# Справка для админов: основной текст с заранее добавленной секцией администратора
+ADMIN_HELP_SECTION = "\n\n🔑 *Для администраторов:*\n• Используйте /admin\\_help для просмотра списка команд администратора"
+HELP_TEXT_ADMIN = HELP_TEXT + ADMIN_HELP_SECTION
+
+# Статические части ответа на /examples, экранированные для MarkdownV2 один раз при импорте
+EXAMPLES_TITLE = "Примеры вопросов"
+EXAMPLES_SECTIONS = (
+    ('html', "HTML:"),
+    ('css', "CSS:"),
+    ('layout', "Вёрстка и макеты:"),
+)
+EXAMPLES_FOOTER = (
+    "💡 Помните: чем конкретнее вопрос, тем полезнее будет ответ!\n\n"
+    "🔍 Полезные советы:\n"
+    "• Всегда показывайте ваш текущий код\n"
+    "• Описывайте желаемый результат\n"
+    "• Указывайте, что вы уже пробовали\n"
+    "• Сообщайте о требованиях к браузерам\n"
+    "• Упоминайте особенности адаптивности"
+)
+EXAMPLES_TITLE_V2 = f"📝 *{escape_md(EXAMPLES_TITLE)}*\n\n"
+EXAMPLES_SECTIONS_V2 = tuple(
+    (category, f"*{escape_md(title)}*\n") for category, title in EXAMPLES_SECTIONS
+)
+EXAMPLES_FOOTER_V2 = escape_md(EXAMPLES_FOOTER)
+
 # Создаем экземпляр модератора
 moderator = Moderator()
 
@@ -107,12 +134,8 @@ async def cmd_help(message: types.Message):
     logger.info(f"Получена команда /help от пользователя {user_id}")
     
     try:
-        help_text = HELP_TEXT
-        
-        # Добавляем секцию для админов
-        if is_admin(user_id):
-            admin_section = "\n\n🔑 *Для администраторов:*\n• Используйте /admin\_help для просмотра списка команд администратора"
-            help_text += admin_section
+        # Для админов используем текст с дополнительной секцией
+        help_text = HELP_TEXT_ADMIN if is_admin(user_id) else HELP_TEXT
         
         await message.reply(help_text, parse_mode=types.ParseMode.MARKDOWN_V2)
     except Exception as e:
@@ -733,13 +756,26 @@ async def cmd_view_feedback(message: types.Message):
         'read': 'Прочитанные отзывы',
         'unread': 'Непрочитанные отзывы'
     }
-    feedback_text = f"📋 *{header_text[filter_type]}*\n"
-    feedback_text += f"Страница {page} из {total_pages}\n\n"
+    # Части сообщения накапливаются во фрагментах и отправляются по мере заполнения
+    max_part_length = 3800
+    current = [
+        f"📋 *{header_text[filter_type]}*\n",
+        f"Страница {page} из {total_pages}\n\n"
+    ]
+    cur_len = sum(len(frag) for frag in current)
+    
+    async def add_fragment(frag: str):
+        nonlocal current, cur_len
+        if current and cur_len + len(frag) > max_part_length:
+            await message.reply("".join(current), parse_mode=types.ParseMode.MARKDOWN)
+            current = []
+            cur_len = 0
+        current.append(frag)
+        cur_len += len(frag)
     
     # Формируем список отзывов
+    unread_ids = []
     for feedback_id, user_id, text, created_at, username, first_name, last_name, is_read in feedback_list:
-        feedback_text += f"*ID:* {feedback_id}\n"
-        
         # Формируем информацию о пользователе
         user_info = []
         if username:
@@ -750,29 +786,37 @@ async def cmd_view_feedback(message: types.Message):
             user_info.append(last_name)
         
         user_display = " ".join(user_info) if user_info else str(user_id)
-        feedback_text += f"*От:* {user_display} (ID: {user_id})\n"
-        feedback_text += f"*Дата:* {created_at}\n"
-        feedback_text += f"*Статус:* {'Прочитано' if is_read else 'Не прочитано'}\n"
-        feedback_text += f"*Текст:* {text}\n"
-        feedback_text += "-" * 30 + "\n"
+        entry = (
+            f"*ID:* {feedback_id}\n"
+            f"*От:* {user_display} (ID: {user_id})\n"
+            f"*Дата:* {created_at}\n"
+            f"*Статус:* {'Прочитано' if is_read else 'Не прочитано'}\n"
+            f"*Текст:* {text}\n"
+            + "-" * 30 + "\n"
+        )
+        
+        # Слишком длинный отзыв отправляем кусками по 4000 символов
+        for i in range(0, len(entry), 4000):
+            await add_fragment(entry[i:i+4000])
         
-        # Отмечаем отзыв как прочитанный, если он непрочитанный
+        # Запоминаем непрочитанные отзывы, чтобы отметить их одним запросом
         if not is_read:
-            db.mark_feedback_as_read(feedback_id)
+            unread_ids.append(feedback_id)
+    
+    # Отмечаем непрочитанные отзывы как прочитанные
+    db.mark_feedback_list_as_read(unread_ids)
     
     # Добавляем инструкции по навигации
-    feedback_text += "\n💡 *Навигация:*\n"
-    feedback_text += f"• Текущий фильтр: {filter_type}\n"
-    feedback_text += f"• Страница {page} из {total_pages}\n"
-    feedback_text += "• Используйте /view_feedback [all|read|unread] [страница]\n"
-    
-    # Отправляем сообщение частями, если оно слишком длинное
-    if len(feedback_text) > 4000:
-        parts = [feedback_text[i:i+4000] for i in range(0, len(feedback_text), 4000)]
-        for part in parts:
-            await message.reply(part, parse_mode=types.ParseMode.MARKDOWN)
-    else:
-        await message.reply(feedback_text, parse_mode=types.ParseMode.MARKDOWN)
+    await add_fragment(
+        "\n💡 *Навигация:*\n"
+        f"• Текущий фильтр: {filter_type}\n"
+        f"• Страница {page} из {total_pages}\n"
+        "• Используйте /view_feedback [all|read|unread] [страница]\n"
+    )
+    
+    # Отправляем оставшуюся часть
+    if current:
+        await message.reply("".join(current), parse_mode=types.ParseMode.MARKDOWN)
 
 async def cmd_clear_cache(message: types.Message):
     """
@@ -807,24 +851,23 @@ async def cmd_examples(message: types.Message):
     user_id = message.from_user.id
     logger.info(f"Получена команда /examples от пользователя {user_id}")
     
-    examples_text = (
-        "📝 *Примеры вопросов*\n\n"
-        "*HTML:*\n"
-        f"{hint_system.get_example('html')}\n\n"
-        "*CSS:*\n"
-        f"{hint_system.get_example('css')}\n\n"
-        "*Вёрстка и макеты:*\n"
-        f"{hint_system.get_example('layout')}\n\n"
-        "💡 Помните: чем конкретнее вопрос, тем полезнее будет ответ!\n\n"
-        "🔍 Полезные советы:\n"
-        "• Всегда показывайте ваш текущий код\n"
-        "• Описывайте желаемый результат\n"
-        "• Указывайте, что вы уже пробовали\n"
-        "• Сообщайте о требованиях к браузерам\n"
-        "• Упоминайте особенности адаптивности"
-    )
+    # Экранируем только случайные примеры, остальной текст подготовлен заранее
+    examples = [hint_system.get_example(category) for category, _ in EXAMPLES_SECTIONS]
+    examples_text = EXAMPLES_TITLE_V2 + "".join(
+        f"{title}{escape_md(example)}\n\n"
+        for (_, title), example in zip(EXAMPLES_SECTIONS_V2, examples)
+    ) + EXAMPLES_FOOTER_V2
     
-    await safe_reply(message, examples_text, parse_mode=types.ParseMode.MARKDOWN_V2)
+    try:
+        await message.reply(examples_text, parse_mode=types.ParseMode.MARKDOWN_V2)
+    except Exception as e:
+        logger.error(f"Ошибка при отправке примеров: {str(e)}")
+        # В случае ошибки отправляем без форматирования
+        plain_text = f"📝 {EXAMPLES_TITLE}\n\n" + "".join(
+            f"{title}\n{example}\n\n"
+            for (_, title), example in zip(EXAMPLES_SECTIONS, examples)
+        ) + EXAMPLES_FOOTER
+        await safe_reply(message, plain_text)
 
 async def cmd_restart(message: types.Message):
     """
@@ -888,10 +931,7 @@ def register_handlers(dp: Dispatcher):
     dp.register_message_handler(cmd_admin_help, commands=['admin_help', 'adminhelp'])
     
     # Обработка API-ключа
-    dp.register_message_handler(
-        process_api_key,
-        lambda message: message.text.startswith('sk-')
-    )
+    dp.register_message_handler(process_api_key, Text(startswith='sk-'))
     
     # Обработка отзывов
     dp.register_message_handler(cmd_feedback, commands=['feedback'], state=None)
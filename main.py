@@ -2,11 +2,11 @@ import os
 import sys
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.contrib.fsm_storage.redis import RedisStorage2
 from aiogram.utils import executor
 from handlers import register_handlers
 from logger import logger
-from middlewares import RateLimitMiddleware, ValidationMiddleware
+from middlewares import PreflightMiddleware
 
 try:
     print("Запуск бота...")
@@ -25,14 +25,20 @@ try:
     # Инициализируем бота и диспетчер
     try:
         bot = Bot(token=bot_token)
-        storage = MemoryStorage()  # Хранилище для FSM
+        # Хранилище для FSM: состояния переживают перезапуск и не блокируют друг друга
+        storage = RedisStorage2(
+            host=os.getenv('REDIS_HOST', 'localhost'),
+            port=int(os.getenv('REDIS_PORT', 6379)),
+            db=0,
+            pool_size=50,
+            prefix='fsm'
+        )
         dp = Dispatcher(bot, storage=storage)
         print("Бот и диспетчер инициализированы")
         
         # Подключаем middleware
-        dp.middleware.setup(RateLimitMiddleware())
-        dp.middleware.setup(ValidationMiddleware())
-        print("Middleware подключены")
+        dp.middleware.setup(PreflightMiddleware())
+        print("Middleware подключен")
         
     except Exception as e:
         print(f"Ошибка при инициализации бота: {e}")
@@ -49,6 +55,7 @@ try:
     if __name__ == '__main__':
         print("Запуск поллинга...")
         try:
+            # Хранилище FSM закрывает сам executor при остановке поллинга (storage.close() и wait_closed())
             executor.start_polling(dp, skip_updates=True)
         except Exception as e:
             print(f"Ошибка при запуске поллинга: {e}")
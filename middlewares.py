@@ -3,23 +3,24 @@ from aiogram.dispatcher.handler import CancelHandler
 from aiogram.dispatcher.middlewares import BaseMiddleware
 from typing import Dict, Any
 from rate_limiter import RateLimiter
-from validators import validator
+import validators
 from utils import is_admin, safe_reply
 from logger import logger
 
-class RateLimitMiddleware(BaseMiddleware):
+class PreflightMiddleware(BaseMiddleware):
     """
-    Middleware для ограничения частоты запросов
+    Middleware для предварительной проверки сообщений:
+    ограничение частоты запросов и валидация в одном обработчике
     """
     
     def __init__(self):
         super().__init__()
         self.limiter = RateLimiter()
-        logger.info("Rate limit middleware инициализирован")
+        logger.info("Preflight middleware инициализирован")
     
     async def on_pre_process_message(self, message: types.Message, data: Dict[str, Any]):
         """
-        Проверка ограничений перед обработкой сообщения
+        Проверка ограничений и валидация сообщения перед обработкой
         
         Args:
             message (types.Message): Сообщение
@@ -64,35 +65,7 @@ class RateLimitMiddleware(BaseMiddleware):
         
         # Если всё в порядке, добавляем запрос
         self.limiter.add_request(user_id)
-    
-    async def on_post_process_message(self, message: types.Message, data: Dict[str, Any], *args: Any):
-        """
-        Действия после обработки сообщения
         
-        Args:
-            message (types.Message): Сообщение
-            data (Dict[str, Any]): Данные обработчика
-        """
-        # Можно добавить дополнительную логику после обработки сообщения
-        pass
-
-class ValidationMiddleware(BaseMiddleware):
-    """
-    Middleware для валидации входящих сообщений
-    """
-    
-    def __init__(self):
-        super().__init__()
-        logger.info("Validation middleware инициализирован")
-    
-    async def on_pre_process_message(self, message: types.Message, data: Dict[str, Any]):
-        """
-        Валидация сообщения перед обработкой
-        
-        Args:
-            message (types.Message): Сообщение
-            data (Dict[str, Any]): Данные обработчика
-        """
         if not message.text:
             return
             
@@ -102,7 +75,7 @@ class ValidationMiddleware(BaseMiddleware):
             msg_type = 'api_key'
         
         # Проверяем сообщение
-        is_valid, error_reason = validator.validate_message(message.text, msg_type)
+        is_valid, error_reason, sanitized_text = validators.validator.validate_and_sanitize(message.text, msg_type)
         
         if not is_valid:
             # Формируем сообщение об ошибке
@@ -124,16 +97,5 @@ class ValidationMiddleware(BaseMiddleware):
             # Отменяем обработку сообщения
             raise CancelHandler()
         
-        # Если сообщение прошло валидацию, очищаем его
-        if msg_type == 'default':
-            message.text = validator.sanitize_message(message.text)
-    
-    async def on_post_process_message(self, message: types.Message, data: Dict[str, Any], *args: Any):
-        """
-        Действия после обработки сообщения
-        
-        Args:
-            message (types.Message): Сообщение
-            data (Dict[str, Any]): Данные обработчика
-        """
-        pass 
\ No newline at end of file
+        # Если сообщение прошло валидацию, подставляем очищенный текст
+        message.text = sanitized_text
@@ -1,8 +1,15 @@
 import json
 import os
-from typing import Dict, List, Set, Tuple, Optional
+import re
+import ahocorasick
+from typing import Dict, List, Set, Tuple, Optional, Pattern
 from logger import logger
 
+try:
+    import hyperscan
+except ImportError:  # Необязательная зависимость: без неё используется проверка на re
+    hyperscan = None
+
 class ModerationRules:
     """Класс для управления правилами модерации"""
     
@@ -16,6 +23,11 @@ class ModerationRules:
         self.rules_file = rules_file
         self.rules = self._load_rules()
         self._init_stop_words()
+        self._compile_spam_patterns()
+        self._hs_db = None
+        self._hs_dirty = True
+        # Версия правил: увеличивается при каждом изменении, по ней сбрасываются кэши вердиктов
+        self.version = 0
         
     def _load_rules(self) -> Dict:
         """Загрузка правил из файла"""
@@ -33,12 +45,157 @@ class ModerationRules:
             return {}
             
     def _init_stop_words(self):
-        """Инициализация множеств стоп-слов"""
+        """Инициализация множеств стоп-слов и автомата Ахо-Корасик для поиска по сообщению"""
         self.all_stop_words = set()
+        self._automaton = ahocorasick.Automaton()
+        # Фрагменты стоп-слов длиннее 3 символов: слово сообщения, входящее в стоп-слово
+        # (например, 'решение' в 'готовое решение'), находится одним поиском в словаре
+        self._stop_word_fragments = {}
         for category, data in self.rules.get('stop_words', {}).items():
             words = set(data['words'])
             setattr(self, f"{category}_words", words)
             self.all_stop_words.update(words)
+            for word in words:
+                self._add_stop_word_index(word, category)
+        self._automaton_dirty = True
+    
+    def _add_stop_word_index(self, word: str, category: str):
+        """
+        Добавление стоп-слова в автомат и словарь фрагментов
+        
+        Args:
+            word (str): Стоп-слово
+            category (str): Категория слова
+        """
+        word_lower = word.lower()
+        self._automaton.add_word(word_lower, (word, category))
+        for start in range(len(word_lower) - 3):
+            for end in range(start + 4, len(word_lower) + 1):
+                self._stop_word_fragments.setdefault(word_lower[start:end], (word, category))
+            
+    def _compile_spam_patterns(self):
+        """Компиляция спам-паттернов один раз при загрузке правил"""
+        self._spam_patterns = []
+        for pattern_info in self.rules.get('spam_patterns', []):
+            try:
+                compiled = re.compile(pattern_info['pattern'])
+            except re.error as e:
+                logger.error(f"Некорректный спам-паттерн {pattern_info['pattern']}: {e}")
+                continue
+            self._spam_patterns.append((compiled, pattern_info['description']))
+        
+        # Объединяем все паттерны в одну альтернацию: один проход по сообщению вместо N
+        self._spam_regex = None
+        self._spam_descriptions = {}
+        if self._spam_patterns:
+            alternatives = []
+            for i, (compiled, description) in enumerate(self._spam_patterns):
+                alternatives.append(f"(?P<p{i}>{compiled.pattern})")
+                self._spam_descriptions[f"p{i}"] = description
+            try:
+                self._spam_regex = re.compile("|".join(alternatives))
+            except re.error as e:
+                # Например, при конфликте именованных групп или глобальных флагах внутри паттерна
+                logger.warning(f"Не удалось объединить спам-паттерны, используется поочередная проверка: {e}")
+            
+    def _build_hyperscan_db(self):
+        """
+        Сборка базы Hyperscan из спам-паттернов, слов комбинаций и стоп-слов
+        
+        Каждому выражению соответствует запись в self._hs_entries:
+        ('spam', индекс в self._spam_patterns) или ('combo', (индекс комбинации, позиция слова)).
+        Стоп-слова проверяются через find_stop_word: им нужны границы слов, которых Hyperscan не учитывает
+        """
+        self._hs_db = None
+        self._hs_dirty = False
+        if hyperscan is None:
+            return
+        
+        expressions, flags, entries = [], [], []
+        literal_flags = hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP | hyperscan.HS_FLAG_SINGLEMATCH
+        
+        for i, (compiled, description) in enumerate(self._spam_patterns):
+            expressions.append(compiled.pattern.encode('utf-8'))
+            flags.append(hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_SOM_LEFTMOST)
+            entries.append(('spam', i))
+        
+        for i, combo in enumerate(self.rules.get('word_combinations', [])):
+            for j, word in enumerate(combo['words']):
+                expressions.append(re.escape(word.lower()).encode('utf-8'))
+                flags.append(literal_flags)
+                entries.append(('combo', (i, j)))
+        
+        if not expressions:
+            return
+        
+        try:
+            db = hyperscan.Database()
+            db.compile(
+                expressions=expressions,
+                ids=list(range(len(expressions))),
+                elements=len(expressions),
+                flags=flags
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось собрать базу Hyperscan, используется проверка на re: {e}")
+            return
+        
+        self._hs_db = db
+        self._hs_entries = entries
+        logger.info(f"База Hyperscan собрана: {len(expressions)} выражений")
+    
+    def scan(self, message: str) -> Optional[Dict]:
+        """
+        Проверка сообщения всеми правилами за один проход Hyperscan
+        
+        Args:
+            message (str): Проверяемое сообщение
+            
+        Returns:
+            Optional[Dict]: None, если Hyperscan недоступен, иначе словарь с ключами
+                'combination' (Optional[Dict]) - сработавшая комбинация слов,
+                'stop_word' (Optional[Tuple[str, str]]) - (стоп-слово, категория),
+                'spam' (Optional[Tuple[str, str]]) - (найденный фрагмент, описание паттерна)
+        """
+        if self._hs_dirty:
+            self._build_hyperscan_db()
+        if self._hs_db is None:
+            return None
+        
+        data = message.encode('utf-8')
+        matched = {}
+        
+        def on_match(expr_id, start, end, flags, context):
+            if expr_id not in matched:
+                matched[expr_id] = (start, end)
+        
+        self._hs_db.scan(data, match_event_handler=on_match)
+        
+        result = {'combination': None, 'stop_word': self.find_stop_word(message.lower()), 'spam': None}
+        combo_words = {}
+        for expr_id in sorted(matched):
+            kind, info = self._hs_entries[expr_id]
+            if kind == 'spam' and result['spam'] is None:
+                # Hyperscan сообщает совпадение на каждой конечной позиции, и первое из них самое короткое.
+                # Точный фрагмент для предупреждений и лога берем у соответствующего паттерна re
+                compiled, description = self._spam_patterns[info]
+                match = compiled.search(message)
+                if match:
+                    fragment = match.group()
+                else:
+                    start, end = matched[expr_id]
+                    fragment = data[start:end].decode('utf-8', 'ignore')
+                result['spam'] = (fragment, description)
+            elif kind == 'combo':
+                combo_words.setdefault(info[0], set()).add(info[1])
+        
+        combinations = self.rules.get('word_combinations', [])
+        for i in sorted(combo_words):
+            if len(combo_words[i]) == len(combinations[i]['words']):
+                result['combination'] = combinations[i]
+                break
+        
+        return result
             
     def check_word(self, word: str) -> Tuple[bool, Optional[str]]:
         """
@@ -57,31 +214,96 @@ class ModerationRules:
                     return True, category
         return False, None
         
-    def check_combination(self, message: str) -> Tuple[bool, Optional[Dict]]:
+    def find_stop_word(self, message_lower: str) -> Optional[Tuple[str, str]]:
+        """
+        Поиск стоп-слов в сообщении за один проход автомата Ахо-Корасик
+        
+        Нарушением считается стоп-слово внутри слова длиннее 3 символов, фраза из стоп-слов целиком
+        или слово длиннее 3 символов, входящее в стоп-слово
+        
+        Args:
+            message_lower (str): Проверяемое сообщение в нижнем регистре
+            
+        Returns:
+            Optional[Tuple[str, str]]: (стоп-слово, категория) или None
+        """
+        if len(self._automaton) == 0:
+            return None
+        if self._automaton_dirty:
+            self._automaton.make_automaton()
+            self._automaton_dirty = False
+        for end, found in self._automaton.iter(message_lower):
+            word_length = len(found[0])
+            # Фразы из нескольких слов засчитываются целиком, отдельные стоп-слова - только внутри слова длиннее 3 символов
+            if ' ' in found[0] or self._token_length(message_lower, end - word_length + 1, end + 1) > 3:
+                return found
+        
+        # Слова сообщения, входящие в стоп-слово
+        fragments = self._stop_word_fragments
+        for token in message_lower.split():
+            if len(token) > 3 and token in fragments:
+                return fragments[token]
+        return None
+    
+    @staticmethod
+    def _token_length(text: str, start: int, end: int) -> int:
+        """
+        Длина слова (по пробельным символам, как в str.split), содержащего фрагмент text[start:end]
+        """
+        while start > 0 and not text[start - 1].isspace():
+            start -= 1
+        while end < len(text) and not text[end].isspace():
+            end += 1
+        return end - start
+        
+    def check_combination(self, message: str, message_lower: Optional[str] = None) -> Tuple[bool, Optional[Dict]]:
         """
         Проверка комбинаций стоп-слов в сообщении
         
         Args:
             message (str): Проверяемое сообщение
+            message_lower (Optional[str]): Сообщение в нижнем регистре, если уже вычислено
             
         Returns:
             Tuple[bool, Optional[Dict]]: (Найдено ли нарушение, информация о комбинации)
         """
-        message = message.lower()
+        message = message_lower if message_lower is not None else message.lower()
         for combo in self.rules.get('word_combinations', []):
             word1, word2 = combo['words']
             if word1 in message and word2 in message:
                 return True, combo
         return False, None
         
-    def get_spam_patterns(self) -> List[Dict]:
+    def get_spam_patterns(self) -> List[Tuple[Pattern, str]]:
+        """
+        Получение списка скомпилированных спам-паттернов
+        
+        Returns:
+            List[Tuple[Pattern, str]]: Список (скомпилированный паттерн, описание)
+        """
+        return self._spam_patterns
+        
+    def find_spam(self, message: str) -> Optional[Tuple[str, str]]:
         """
-        Получение списка спам-паттернов
+        Поиск спам-паттернов в сообщении
         
+        Args:
+            message (str): Проверяемое сообщение
+            
         Returns:
-            List[Dict]: Список паттернов с описаниями
+            Optional[Tuple[str, str]]: (найденный фрагмент, описание паттерна) или None
         """
-        return self.rules.get('spam_patterns', [])
+        if self._spam_regex is not None:
+            match = self._spam_regex.search(message)
+            if match:
+                # Внешняя группа закрывается последней, поэтому lastgroup указывает на неё
+                return match.group(), self._spam_descriptions[match.lastgroup]
+            return None
+        
+        for pattern, description in self._spam_patterns:
+            if match := pattern.search(message):
+                return match.group(), description
+        return None
         
     def save_rules(self):
         """Сохранение правил в файл"""
@@ -110,7 +332,17 @@ class ModerationRules:
         
         if word not in self.rules['stop_words'][category]['words']:
             self.rules['stop_words'][category]['words'].append(word)
-            self._init_stop_words()
+            # Обновляем множества на месте, без полной перестройки
+            category_words = getattr(self, f"{category}_words", None)
+            if category_words is None:
+                category_words = set()
+                setattr(self, f"{category}_words", category_words)
+            category_words.add(word)
+            self.all_stop_words.add(word)
+            # Автомат перестраивается при следующей проверке
+            self._add_stop_word_index(word, category)
+            self._automaton_dirty = True
+            self.version += 1
             self.save_rules()
             logger.info(f"Добавлено новое стоп-слово: {word} (категория: {category})")
             
@@ -134,6 +366,8 @@ class ModerationRules:
             if 'word_combinations' not in self.rules:
                 self.rules['word_combinations'] = []
             self.rules['word_combinations'].append(new_combo)
+            self._hs_dirty = True
+            self.version += 1
             self.save_rules()
             logger.info(f"Добавлена новая комбинация слов: {word1} + {word2} (категория: {category})")
 
@@ -1,10 +1,25 @@
 from typing import Optional, Dict, Any, List, Tuple
-import re
+from collections import OrderedDict
+import string
 from api_client import OpenRouterClient
 from api_reconnector import APIReconnector
 from logger import logger, log_moderation_details
 from moderation_rules import moderation_rules
 
+# Таблица удаления заглавных латинских и кириллических букв для подсчета капса через str.translate
+_UPPERCASE_TABLE = str.maketrans('', '', string.ascii_uppercase + 'АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ')
+# Заглавные ASCII-буквы для bytes.translate: удаление идет по 256-битной таблице без словаря
+_ASCII_UPPERCASE = string.ascii_uppercase.encode('ascii')
+
+def _count_uppercase(msg: str) -> int:
+    """
+    Подсчет заглавных букв в сообщении
+    """
+    if msg.isascii():
+        data = msg.encode('ascii')
+        return len(data) - len(data.translate(None, _ASCII_UPPERCASE))
+    return len(msg) - len(msg.translate(_UPPERCASE_TABLE))
+
 class Moderator:
     """Класс для модерации сообщений"""
     
@@ -12,26 +27,62 @@ class Moderator:
         """
         Инициализация модератора
         """
-        # Триггеры для активации AI-модерации
+        # Триггеры для активации AI-модерации: (название, проверка).
+        # Проверяются по порядку до первого срабатывания, поэтому дешевые идут первыми
         self.triggers = [
             # Длинные сообщения
-            lambda msg: len(msg) > 500,
-            # Капс
-            lambda msg: sum(1 for c in msg if c.isupper()) / len(msg) > 0.5 if msg else False,
+            ("длинное сообщение", lambda msg: len(msg) > 500),
+            # Капс: на коротких сообщениях доля заглавных не показательна
+            ("капс", lambda msg: len(msg) >= 10 and _count_uppercase(msg) * 2 > len(msg)),
             # Повторяющиеся сообщения (будет дополнено)
-            lambda msg: False  # Заглушка
+            ("повторяющееся сообщение", lambda msg: False)  # Заглушка
         ]
         
         # Счетчики для отслеживания переключений между моделями
         self.gemini_failures = 0
         self.deepseek_failures = 0
         self.max_failures = 3  # После 3 неудач переключаемся
+        
+        # LRU-кэши вердиктов по хэшу нормализованного сообщения: повторные сообщения
+        # не проходят проверки заново и не отправляются в AI повторно
+        self.verdict_cache_size = 4096
+        self._verdict_cache: OrderedDict[int, Tuple[bool, Optional[str]]] = OrderedDict()
+        self._ai_verdict_cache: OrderedDict[int, Tuple[bool, Optional[str]]] = OrderedDict()
+    
+    @staticmethod
+    def _cache_key(message: str, ignore_case: bool = True) -> int:
+        """
+        Ключ кэша вердиктов для сообщения
+        
+        Регистр учитывается для полного вердикта, так как от него зависит триггер капса.
+        В ключ входит версия правил: после их изменения старые вердикты не находятся и вытесняются из LRU
+        """
+        message = message.strip()
+        return hash((moderation_rules.version, message.lower() if ignore_case else message))
+    
+    def _cache_get(self, cache: OrderedDict, key: int) -> Optional[Tuple[bool, Optional[str]]]:
+        """
+        Получение вердикта из LRU-кэша
+        """
+        verdict = cache.get(key)
+        if verdict is not None:
+            cache.move_to_end(key)
+        return verdict
+    
+    def _cache_put(self, cache: OrderedDict, key: int, verdict: Tuple[bool, Optional[str]]) -> None:
+        """
+        Сохранение вердикта в LRU-кэш с вытеснением самой старой записи
+        """
+        cache[key] = verdict
+        cache.move_to_end(key)
+        if len(cache) > self.verdict_cache_size:
+            cache.popitem(last=False)
     
-    def check_word_combinations(self, message: str) -> Tuple[bool, Optional[str]]:
+    def check_word_combinations(self, message: str, message_lower: Optional[str] = None) -> Tuple[bool, Optional[str]]:
         """
         Проверка комбинаций стоп-слов в сообщении
         """
-        is_violation, combo_info = moderation_rules.check_combination(message)
+        is_violation, combo_info = moderation_rules.check_combination(message, message_lower)
         if is_violation:
             words = combo_info['words']
             category = combo_info['category']
@@ -41,53 +92,100 @@ class Moderator:
             return True, reason
         return False, None
 
-    def check_partial_matches(self, message: str) -> Tuple[bool, Optional[str]]:
+    def check_partial_matches(self, message: str, message_lower: Optional[str] = None) -> Tuple[bool, Optional[str]]:
         """
         Проверка частичных совпадений со стоп-словами
         """
-        message_lower = message.lower()
-        words = message_lower.split()
-        
-        for word in words:
-            is_violation, category = moderation_rules.check_word(word)
-            if is_violation:
-                reason = f"Обнаружено запрещенное слово: '{word}' (категория: {category})"
-                logger.info(f"{reason} в сообщении: {message[:100]}")
-                return True, reason
+        if message_lower is None:
+            message_lower = message.lower()
+        found = moderation_rules.find_stop_word(message_lower)
+        if found:
+            word, category = found
+            reason = f"Обнаружено запрещенное слово: '{word}' (категория: {category})"
+            logger.info(f"{reason} в сообщении: {message[:100]}")
+            return True, reason
         return False, None
 
     def check_triggers(self, message: str) -> Tuple[bool, Optional[str]]:
         """
         Проверка наличия триггеров в сообщении
         """
+        # Сначала дешевые структурные проверки (длина, капс)
+        is_violation, reason = self.check_structural_triggers(message)
+        if is_violation:
+            return True, reason
+        
+        is_violation, reason = self.check_rules(message)
+        if is_violation:
+            return True, reason
+        
+        logger.info(f"Сообщение прошло все проверки триггеров: {message[:100]}")
+        return False, None
+    
+    def check_rules(self, message: str) -> Tuple[bool, Optional[str]]:
+        """
+        Проверка сообщения по правилам модерации (комбинации, стоп-слова, спам-паттерны)
+        """
+        # Если доступен Hyperscan, проверяем все правила за один проход
+        scan_result = moderation_rules.scan(message)
+        if scan_result is not None:
+            return self.check_scan_result(message, scan_result)
+        
+        # Приводим сообщение к нижнему регистру один раз для всех проверок слов
+        message_lower = message.lower()
+        
         # Проверка комбинаций слов
-        is_violation, reason = self.check_word_combinations(message)
+        is_violation, reason = self.check_word_combinations(message, message_lower)
         if is_violation:
             return True, reason
             
         # Проверка частичных совпадений
-        is_violation, reason = self.check_partial_matches(message)
+        is_violation, reason = self.check_partial_matches(message, message_lower)
         if is_violation:
             return True, reason
             
         # Проверка спам-паттернов
-        for pattern_info in moderation_rules.get_spam_patterns():
-            pattern = pattern_info['pattern']
-            description = pattern_info['description']
-            if match := re.search(pattern, message):
-                reason = f"Обнаружен спам-паттерн: {description} - найдено: {match.group()}"
-                logger.info(f"{reason} в сообщении: {message[:100]}")
-                return True, reason
+        if spam := moderation_rules.find_spam(message):
+            found, description = spam
+            reason = f"Обнаружен спам-паттерн: {description} - найдено: {found}"
+            logger.info(f"{reason} в сообщении: {message[:100]}")
+            return True, reason
+        
+        return False, None
+    
+    def check_scan_result(self, message: str, scan_result: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+        """
+        Разбор результата проверки правил через Hyperscan
+        """
+        if combo_info := scan_result['combination']:
+            words = combo_info['words']
+            reason = f"Обнаружена запрещенная комбинация слов: '{words[0]}' + '{words[1]}' (категория: {combo_info['category']}, важность: {combo_info['severity']})"
+            logger.info(f"{reason} в сообщении: {message[:100]}")
+            return True, reason
+        
+        if stop_word := scan_result['stop_word']:
+            word, category = stop_word
+            reason = f"Обнаружено запрещенное слово: '{word}' (категория: {category})"
+            logger.info(f"{reason} в сообщении: {message[:100]}")
+            return True, reason
+        
+        if spam := scan_result['spam']:
+            found, description = spam
+            reason = f"Обнаружен спам-паттерн: {description} - найдено: {found}"
+            logger.info(f"{reason} в сообщении: {message[:100]}")
+            return True, reason
         
-        # Проверка триггеров
-        for i, trigger in enumerate(self.triggers):
+        return False, None
+    
+    def check_structural_triggers(self, message: str) -> Tuple[bool, Optional[str]]:
+        """
+        Проверка структурных триггеров (длина, капс)
+        """
+        for trigger_type, trigger in self.triggers:
             if trigger(message):
-                trigger_type = "длинное сообщение" if i == 0 else "капс" if i == 1 else "повторяющееся сообщение"
                 reason = f"Сработал триггер модерации: {trigger_type}"
                 logger.info(f"{reason} в сообщении: {message[:100]}")
                 return True, reason
-        
-        logger.info(f"Сообщение прошло все проверки триггеров: {message[:100]}")
         return False, None
     
     async def moderate_with_ai(self, message: str, api_client: APIReconnector) -> Tuple[bool, Optional[str]]:
@@ -95,6 +193,12 @@ class Moderator:
         Модерация с использованием AI моделей
         Возвращает кортеж (is_violation, reason)
         """
+        key = self._cache_key(message)
+        cached = self._cache_get(self._ai_verdict_cache, key)
+        if cached is not None:
+            logger.info(f"Найден кэшированный вердикт AI для сообщения: {message[:100]}")
+            return cached
+        
         # Сначала пробуем Gemini
         if self.gemini_failures < self.max_failures:
             logger.info(f"Отправка на модерацию Gemini: {message[:100]}")
@@ -102,7 +206,9 @@ class Moderator:
             if result is not None:
                 self.gemini_failures = 0  # Сбрасываем счетчик при успехе
                 log_moderation_details(0, "Gemini", "AI Moderation", message, result)
-                return result.get('is_violation', False), result.get('reason')
+                verdict = (result.get('is_violation', False), result.get('reason'))
+                self._cache_put(self._ai_verdict_cache, key, verdict)
+                return verdict
             self.gemini_failures += 1
             logger.warning(f"Ошибка Gemini (попытка {self.gemini_failures}) для сообщения: {message[:100]}")
         
@@ -113,7 +219,9 @@ class Moderator:
             if result is not None:
                 self.deepseek_failures = 0  # Сбрасываем счетчик при успехе
                 log_moderation_details(0, "DeepSeek", "AI Moderation", message, result)
-                return result.get('is_violation', False), result.get('reason')
+                verdict = (result.get('is_violation', False), result.get('reason'))
+                self._cache_put(self._ai_verdict_cache, key, verdict)
+                return verdict
             self.deepseek_failures += 1
             logger.warning(f"Ошибка DeepSeek (попытка {self.deepseek_failures}) для сообщения: {message[:100]}")
         
@@ -125,8 +233,22 @@ class Moderator:
         """
         Полная модерация сообщения
         """
-        # Сначала проверяем локальные триггеры
-        is_violation, reason = self.check_triggers(message)
+        key = self._cache_key(message, ignore_case=False)
+        cached = self._cache_get(self._verdict_cache, key)
+        if cached is not None:
+            logger.info(f"Найден кэшированный вердикт для сообщения: {message[:100]}")
+            return cached
+        
+        # Структурные триггеры не требуют подтверждения через AI
+        is_violation, reason = self.check_structural_triggers(message)
+        if is_violation:
+            logger.info(f"Сработали структурные триггеры: {reason}")
+            verdict = (True, reason)
+            self._cache_put(self._verdict_cache, key, verdict)
+            return verdict
+        
+        # Затем проверяем правила модерации
+        is_violation, reason = self.check_rules(message)
         if is_violation:
             logger.info(f"Сработали локальные триггеры: {reason}")
             # Дополнительная проверка через AI
@@ -135,7 +257,10 @@ class Moderator:
                 final_reason = f"Локальная причина: {reason}. AI причина: {ai_reason}"
             else:
                 final_reason = reason
-            return True, final_reason
+            verdict = (True, final_reason)
+        else:
+            logger.info("Сообщение прошло локальную проверку")
+            verdict = (False, None)
         
-        logger.info("Сообщение прошло локальную проверку")
-        return False, None 
\ No newline at end of file
+        self._cache_put(self._verdict_cache, key, verdict)
+        return verdict 
\ No newline at end of file
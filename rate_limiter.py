@@ -1,6 +1,6 @@
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import OrderedDict
 import time
 from logger import logger
 
@@ -10,7 +10,7 @@ class RateLimiter:
     
     Attributes:
         limits (Dict): Настройки лимитов для разных типов пользователей
-        requests (Dict): Хранилище запросов пользователей
+        buckets (Dict): Счетчики запросов пользователей в скользящем окне
         violations (Dict): Счетчик нарушений пользователей
     """
     
@@ -22,32 +22,74 @@ class RateLimiter:
             'new_user': {'requests': 10, 'interval': 60}  # 10 запросов в минуту для новых пользователей
         }
         
-        # Хранилище запросов пользователей: {user_id: [(timestamp, count)]}
-        self.requests = defaultdict(list)
+        # Счетчики скользящего окна:
+        # {user_id: [начало текущего окна, интервал, запросов в прошлом окне, запросов в текущем окне, время последнего запроса]}
+        # Порядок записей соответствует давности обращения: неактивные пользователи в начале
+        self.buckets: OrderedDict[int, List[float]] = OrderedDict()
         
         # Счетчик нарушений: {user_id: count}
-        self.violations = defaultdict(int)
+        self.violations: OrderedDict[int, int] = OrderedDict()
+        
+        # Максимальное количество пользователей в памяти
+        self.max_users = 100_000
         
         logger.info("Rate limiter инициализирован")
     
-    def _clean_old_requests(self, user_id: int, interval: int) -> None:
+    def _get_bucket(self, user_id: int, interval: int, current_time: float) -> List[float]:
         """
-        Очистка устаревших запросов пользователя
+        Получение счетчиков пользователя со сдвигом окна при необходимости
         
         Args:
             user_id (int): ID пользователя
             interval (int): Интервал в секундах
+            current_time (float): Текущее время
+            
+        Returns:
+            List[float]: Счетчики пользователя
         """
-        current_time = time.time()
-        self.requests[user_id] = [
-            (ts, count) for ts, count in self.requests[user_id]
-            if current_time - ts < interval
-        ]
+        bucket_start = int(current_time) // interval * interval
+        bucket = self.buckets.get(user_id)
+        
+        if bucket is None:
+            bucket = [bucket_start, interval, 0, 0, None]
+            self.buckets[user_id] = bucket
+            self._evict_stale(current_time)
+        else:
+            self.buckets.move_to_end(user_id)
+        
+        if bucket[0] != bucket_start or bucket[1] != interval:
+            # Текущее окно стало прошлым; если пропущено больше одного окна, прошлое пустое
+            previous = bucket[3] if bucket[1] == interval and bucket_start - bucket[0] == interval else 0
+            bucket[0], bucket[1], bucket[2], bucket[3] = bucket_start, interval, previous, 0
+        
+        return bucket
+    
+    def _evict_stale(self, current_time: float) -> None:
+        """
+        Удаление счетчиков неактивных пользователей
+        
+        Счетчики устаревают, когда с начала окна прошло два интервала:
+        и текущее, и прошлое окно больше не влияют на лимит
+        
+        Args:
+            current_time (float): Текущее время
+        """
+        while self.buckets:
+            bucket = next(iter(self.buckets.values()))
+            if current_time - bucket[0] < 2 * bucket[1] and len(self.buckets) <= self.max_users:
+                break
+            self.buckets.popitem(last=False)
+            
+        while len(self.violations) > self.max_users:
+            self.violations.popitem(last=False)
     
     def check_limit(self, user_id: int, user_type: str = 'default') -> Tuple[bool, Optional[float]]:
         """
         Проверка, не превышен ли лимит запросов
         
+        Количество запросов оценивается по двум окнам: прошлое окно учитывается
+        с весом, пропорциональным его части, попадающей в последний интервал
+        
         Args:
             user_id (int): ID пользователя
             user_type (str): Тип пользователя ('default', 'admin', 'new_user')
@@ -59,17 +101,21 @@ class RateLimiter:
         max_requests = limit['requests']
         interval = limit['interval']
         
-        # Очищаем старые запросы
-        self._clean_old_requests(user_id, interval)
+        current_time = time.time()
+        bucket_start, _, prev_count, curr_count, _ = self._get_bucket(user_id, interval, current_time)
+        elapsed = current_time - bucket_start
         
         # Считаем текущее количество запросов
-        current_time = time.time()
-        total_requests = sum(count for ts, count in self.requests[user_id])
+        total_requests = prev_count * (1 - elapsed / interval) + curr_count
         
         if total_requests >= max_requests:
             # Находим время до сброса лимита
-            oldest_ts = min(ts for ts, _ in self.requests[user_id]) if self.requests[user_id] else current_time
-            time_to_reset = interval - (current_time - oldest_ts)
+            if curr_count >= max_requests:
+                # Ждем конца текущего окна, пока его вес не уменьшится достаточно
+                time_to_reset = (interval - elapsed) + interval * (1 - max_requests / curr_count)
+            else:
+                # Ждем, пока вес прошлого окна уменьшится достаточно
+                time_to_reset = interval * (1 - (max_requests - curr_count) / prev_count) - elapsed
             return False, max(0, time_to_reset)
             
         return True, None
@@ -82,7 +128,11 @@ class RateLimiter:
             user_id (int): ID пользователя
         """
         current_time = time.time()
-        self.requests[user_id].append((current_time, 1))
+        bucket = self.buckets.get(user_id)
+        interval = bucket[1] if bucket else self.limits['default']['interval']
+        bucket = self._get_bucket(user_id, interval, current_time)
+        bucket[3] += 1
+        bucket[4] = current_time
         logger.debug(f"Добавлен новый запрос для пользователя {user_id}")
     
     def add_violation(self, user_id: int) -> int:
@@ -95,8 +145,9 @@ class RateLimiter:
         Returns:
             int: Общее количество нарушений
         """
-        self.violations[user_id] += 1
-        violations_count = self.violations[user_id]
+        violations_count = self.violations.get(user_id, 0) + 1
+        self.violations[user_id] = violations_count
+        self.violations.move_to_end(user_id)
         logger.warning(f"Добавлено нарушение для пользователя {user_id}. Всего нарушений: {violations_count}")
         return violations_count
     
@@ -121,10 +172,15 @@ class RateLimiter:
         Returns:
             Dict: Статистика пользователя
         """
-        self._clean_old_requests(user_id, max(limit['interval'] for limit in self.limits.values()))
+        current_time = time.time()
+        bucket = self.buckets.get(user_id)
+        requests = 0
+        if bucket:
+            bucket_start, interval, prev_count, curr_count, _ = self._get_bucket(user_id, bucket[1], current_time)
+            requests = round(prev_count * (1 - (current_time - bucket_start) / interval) + curr_count)
         
         return {
-            'requests': len(self.requests[user_id]),
-            'violations': self.violations[user_id],
-            'last_request': max((ts for ts, _ in self.requests[user_id]), default=None)
+            'requests': requests,
+            'violations': self.violations.get(user_id, 0),
+            'last_request': bucket[4] if bucket else None
         } 
\ No newline at end of file
@@ -1,8 +1,11 @@
-from typing import Optional, List, Union
+from typing import Optional, List, Union, FrozenSet
 from aiogram import types
+from aiogram.utils.exceptions import RetryAfter
 from logger import logger
+import asyncio
 import re
 from cryptography.fernet import Fernet
+from cachetools import TTLCache
 import os
 from dotenv import load_dotenv
 from formatting import format_error, safe_format_message
@@ -10,12 +13,18 @@ from formatting import format_error, safe_format_message
 # Загружаем переменные окружения
 load_dotenv()
 
+# Формат API-ключа: префикс 'sk-', затем буквы, цифры и дефисы
+_API_KEY_RE = re.compile(r'\Ask-[A-Za-z0-9\-]{20,}\Z')
+
+# Кэш расшифрованных API-ключей: {user_id: api_key}, запись живет 5 минут
+_KEY_CACHE = TTLCache(maxsize=10_000, ttl=300)
+
 def is_valid_api_key(api_key: str) -> bool:
     """
     Проверка формата API-ключа
     """
     # OpenRouter API-ключи обычно начинаются с 'sk-' и содержат буквы, цифры и дефисы
-    return bool(api_key and api_key.startswith('sk-'))
+    return bool(api_key) and _API_KEY_RE.match(api_key) is not None
 
 def format_error_message(error: Exception) -> str:
     """
@@ -61,18 +70,42 @@ async def safe_reply(message: types.Message, text: str, parse_mode: Optional[str
     """
     try:
         formatted_text = safe_format_message(text) if parse_mode else text
-        await message.reply(formatted_text, parse_mode=parse_mode)
+        await _reply_with_retry(message, formatted_text, parse_mode)
         return True
     except Exception as e:
         logger.error(f"Ошибка при отправке сообщения: {e}")
+        if parse_mode is None:
+            return False
         try:
             # Пробуем отправить без форматирования
-            await message.reply(text)
+            await _reply_with_retry(message, text)
             return True
         except Exception as e:
             logger.error(f"Критическая ошибка при отправке сообщения: {e}")
             return False
 
+async def _reply_with_retry(message: types.Message, text: str, parse_mode: Optional[str] = None, max_attempts: int = 3):
+    """
+    Отправка ответа с повтором при ограничении частоты со стороны Telegram
+    
+    Ожидание берется из retry_after ответа Telegram и удваивается с каждой попыткой
+    
+    Args:
+        message (types.Message): Сообщение, на которое отвечаем
+        text (str): Текст ответа
+        parse_mode (Optional[str]): Режим форматирования
+        max_attempts (int): Максимальное количество попыток
+    """
+    for attempt in range(max_attempts):
+        try:
+            return await message.reply(text, parse_mode=parse_mode)
+        except RetryAfter as e:
+            if attempt == max_attempts - 1:
+                raise
+            delay = e.timeout * (2 ** attempt)
+            logger.warning(f"Telegram ограничил частоту запросов, повтор через {delay} с")
+            await asyncio.sleep(delay)
+
 def split_long_message(text: str, max_length: int = 3500) -> List[str]:
     """
     Разделение длинного сообщения на части с сохранением форматирования
@@ -81,26 +114,50 @@ def split_long_message(text: str, max_length: int = 3500) -> List[str]:
         return [text]
         
     parts = []
-    current_part = ""
+    # Строки текущей части и её длина с учетом переводов строк
+    buf = []
+    buf_len = 0
     code_block = False
     
     for line in text.split('\n'):
         # Проверяем начало/конец блока кода
-        if line.strip().startswith('```'):
+        if '`' in line and line.lstrip().startswith('```'):
             code_block = not code_block
             
+        line_len = len(line) + 1
         # Если текущая часть станет слишком длинной
-        if len(current_part) + len(line) + 2 > max_length and not code_block:
-            parts.append(current_part)
-            current_part = line
+        if buf_len + line_len > max_length and not code_block and buf:
+            parts.append('\n'.join(buf))
+            buf = [line]
+            buf_len = line_len
         else:
-            current_part += '\n' + line if current_part else line
+            buf.append(line)
+            buf_len += line_len
             
-    if current_part:
-        parts.append(current_part)
+    if buf:
+        parts.append('\n'.join(buf))
         
     return parts
 
+# Объект Fernet создается один раз при первом использовании
+_FERNET: Optional[Fernet] = None
+
+def _get_fernet() -> Optional[Fernet]:
+    """
+    Получение объекта Fernet с ключом шифрования из переменных окружения
+    
+    Returns:
+        Optional[Fernet]: Объект Fernet или None, если ключ шифрования не задан
+    """
+    global _FERNET
+    if _FERNET is None:
+        encryption_key = os.getenv('ENCRYPTION_KEY')
+        if not encryption_key:
+            logger.error("Отсутствует ключ шифрования в переменных окружения")
+            return None
+        _FERNET = Fernet(encryption_key.encode())
+    return _FERNET
+
 def encrypt_api_key(api_key: str) -> Optional[str]:
     """
     Шифрование API-ключа
@@ -112,14 +169,10 @@ def encrypt_api_key(api_key: str) -> Optional[str]:
         Optional[str]: Зашифрованный ключ или None в случае ошибки
     """
     try:
-        # Получаем ключ шифрования из переменных окружения
-        encryption_key = os.getenv('ENCRYPTION_KEY')
-        if not encryption_key:
-            logger.error("Отсутствует ключ шифрования в переменных окружения")
+        # Получаем объект Fernet с ключом шифрования
+        f = _get_fernet()
+        if f is None:
             return None
-            
-        # Создаем объект Fernet с ключом шифрования
-        f = Fernet(encryption_key.encode())
         
         # Шифруем API-ключ
         encrypted_key = f.encrypt(api_key.encode())
@@ -139,14 +192,10 @@ def decrypt_api_key(encrypted_key: str) -> Optional[str]:
         Optional[str]: Расшифрованный ключ или None в случае ошибки
     """
     try:
-        # Получаем ключ шифрования из переменных окружения
-        encryption_key = os.getenv('ENCRYPTION_KEY')
-        if not encryption_key:
-            logger.error("Отсутствует ключ шифрования в переменных окружения")
+        # Получаем объект Fernet с ключом шифрования
+        f = _get_fernet()
+        if f is None:
             return None
-            
-        # Создаем объект Fernet с ключом шифрования
-        f = Fernet(encryption_key.encode())
         
         # Расшифровываем API-ключ
         decrypted_key = f.decrypt(encrypted_key.encode())
@@ -155,6 +204,71 @@ def decrypt_api_key(encrypted_key: str) -> Optional[str]:
         logger.error(f"Ошибка при расшифровке API-ключа: {e}")
         return None 
 
+def get_user_api_key(user_id: int, encrypted_key: str) -> Optional[str]:
+    """
+    Получение расшифрованного API-ключа пользователя с кэшированием
+    
+    Args:
+        user_id (int): ID пользователя
+        encrypted_key (str): Зашифрованный API-ключ из базы
+        
+    Returns:
+        Optional[str]: Расшифрованный ключ или None в случае ошибки
+    """
+    api_key = _KEY_CACHE.get(user_id)
+    if api_key is None:
+        api_key = decrypt_api_key(encrypted_key)
+        if api_key:
+            _KEY_CACHE[user_id] = api_key
+    return api_key
+
+def invalidate_api_key(user_id: int) -> None:
+    """
+    Удаление API-ключа пользователя из кэша
+    
+    Args:
+        user_id (int): ID пользователя
+    """
+    _KEY_CACHE.pop(user_id, None)
+
+def _parse_admin_ids(admin_ids_str: str) -> FrozenSet[int]:
+    """
+    Разбор списка ID администраторов из строки через запятую
+    
+    Args:
+        admin_ids_str (str): Строка с ID администраторов
+        
+    Returns:
+        FrozenSet[int]: Множество ID администраторов
+    """
+    admin_ids = set()
+    for id_str in admin_ids_str.split(','):
+        id_str = id_str.strip()
+        if not id_str:
+            continue
+        if not id_str.lstrip('-').isdigit():
+            logger.error(f"Некорректный ID администратора в списке: {id_str}")
+            continue
+        admin_ids.add(int(id_str))
+    return frozenset(admin_ids)
+
+def reload_admins() -> FrozenSet[int]:
+    """
+    Повторное чтение списка администраторов из переменной окружения ADMIN_IDS
+    
+    Returns:
+        FrozenSet[int]: Множество ID администраторов
+    """
+    global _ADMIN_IDS
+    _ADMIN_IDS = _parse_admin_ids(os.getenv('ADMIN_IDS', ''))
+    if not _ADMIN_IDS:
+        logger.warning("Список администраторов пуст")
+    return _ADMIN_IDS
+
+# Список ID администраторов разбирается один раз при импорте
+_ADMIN_IDS: FrozenSet[int] = frozenset()
+reload_admins()
+
 def is_admin(user_id: int) -> bool:
     """
     Проверка, является ли пользователь администратором
@@ -165,16 +279,4 @@ def is_admin(user_id: int) -> bool:
     Returns:
         bool: True если пользователь администратор, False иначе
     """
-    # Получаем список ID администраторов из переменной окружения
-    admin_ids_str = os.getenv('ADMIN_IDS', '')
-    if not admin_ids_str:
-        logger.warning("Список администраторов пуст")
-        return False
-        
-    try:
-        # Преобразуем строку с ID в список чисел
-        admin_ids = [int(id_str) for id_str in admin_ids_str.split(',')]
-        return user_id in admin_ids
-    except ValueError:
-        logger.error("Некорректный формат списка администраторов")
-        return False
+    return user_id in _ADMIN_IDS
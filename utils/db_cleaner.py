@@ -40,30 +40,31 @@ class DatabaseCleaner:
             
             cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
             
-            # Получаем список неактивных пользователей
-            cursor.execute('''
+            # Удаляем связанные записи и самих пользователей одной транзакцией
+            cursor.execute('BEGIN IMMEDIATE')
+            inactive_users = '''
                 SELECT user_id FROM users 
                 WHERE last_activity < ? 
                 AND api_key IS NULL
+            '''
+            # Удаляем нарушения
+            cursor.execute(f'DELETE FROM violations WHERE user_id IN ({inactive_users})', (cutoff_date,))
+            # Удаляем отзывы
+            cursor.execute(f'DELETE FROM feedback WHERE user_id IN ({inactive_users})', (cutoff_date,))
+            # Удаляем пользователей
+            cursor.execute('''
+                DELETE FROM users 
+                WHERE last_activity < ? 
+                AND api_key IS NULL
             ''', (cutoff_date,))
             
-            inactive_users = cursor.fetchall()
+            count = cursor.rowcount
+            conn.commit()
             
-            if not inactive_users:
+            if count == 0:
                 self.logger.info("Неактивных пользователей не найдено")
                 return 0
             
-            # Удаляем связанные записи
-            for user_id in inactive_users:
-                # Удаляем нарушения
-                cursor.execute('DELETE FROM violations WHERE user_id = ?', user_id)
-                # Удаляем отзывы
-                cursor.execute('DELETE FROM feedback WHERE user_id = ?', user_id)
-                # Удаляем пользователя
-                cursor.execute('DELETE FROM users WHERE user_id = ?', user_id)
-            
-            conn.commit()
-            count = len(inactive_users)
             self.logger.info(f"Удалено {count} неактивных пользователей")
             return count
             
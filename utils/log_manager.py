@@ -1,6 +1,6 @@
 import os
 import logging
-import shutil
+import zipfile
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -25,23 +25,29 @@ class LogManager:
     def clean_old_logs(self):
         """Очистка старых лог-файлов"""
         try:
-            current_time = datetime.now()
+            current_time = datetime.now().timestamp()
             cleaned_count = 0
             total_size_freed = 0
 
-            for log_file in self.log_dir.glob("**/*.log"):
-                if log_file.name == "log_manager.log":
-                    continue
+            # Обходим каталоги через os.scandir: stat берется один раз на файл
+            dirs = [self.log_dir]
+            while dirs:
+                with os.scandir(dirs.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.path)
+                            continue
+                        if not entry.name.endswith(".log") or entry.name == "log_manager.log":
+                            continue
 
-                file_time = datetime.fromtimestamp(log_file.stat().st_mtime)
-                age_days = (current_time - file_time).days
+                        stat = entry.stat(follow_symlinks=False)
+                        age_days = int((current_time - stat.st_mtime) // 86400)
 
-                if age_days > self.max_age_days:
-                    file_size = log_file.stat().st_size
-                    log_file.unlink()
-                    cleaned_count += 1
-                    total_size_freed += file_size
-                    self.logger.info(f"Удален старый лог: {log_file}")
+                        if age_days > self.max_age_days:
+                            os.unlink(entry.path)
+                            cleaned_count += 1
+                            total_size_freed += stat.st_size
+                            self.logger.info(f"Удален старый лог: {entry.path}")
 
             self.logger.info(
                 f"Очистка завершена: удалено {cleaned_count} файлов, "
@@ -63,12 +69,15 @@ class LogManager:
             archive_date = current_time.strftime("%Y%m%d")
             archive_name = f"logs_archive_{archive_date}.zip"
             
-            # Создаем архив
-            shutil.make_archive(
-                str(archive_path / archive_name.replace('.zip', '')),
-                'zip',
-                self.log_dir
-            )
+            # Создаем архив: файлы пишутся в zip по одному, каталог архивов пропускаем
+            archive_root = archive_path.resolve()
+            with zipfile.ZipFile(archive_path / archive_name, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+                for log_file in self.log_dir.glob("**/*.log"):
+                    if archive_root in log_file.resolve().parents:
+                        continue
+                    if log_file.stat().st_size == 0:
+                        continue
+                    zf.write(log_file, arcname=log_file.relative_to(self.log_dir))
             
             self.logger.info(f"Логи успешно архивированы: {archive_name}")
             return True
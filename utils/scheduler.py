@@ -1,7 +1,7 @@
-import schedule
-import time
+import asyncio
 import logging
 from pathlib import Path
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from log_manager import LogManager
 from db_cleaner import DatabaseCleaner
 from database import Database
@@ -11,6 +11,7 @@ class TaskScheduler:
         self.log_manager = LogManager()
         self.db = Database()
         self.db_cleaner = DatabaseCleaner(self.db)
+        self.scheduler = AsyncIOScheduler()
         self.logger = logging.getLogger("TaskScheduler")
         self._setup_logging()
 
@@ -29,39 +30,56 @@ class TaskScheduler:
             ]
         )
 
+    async def _run_blocking(self, func):
+        """Выполнение блокирующей задачи в пуле потоков, чтобы не останавливать цикл событий"""
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, func)
+        except Exception as e:
+            self.logger.error(f"Ошибка в планировщике: {str(e)}")
+
+    def _add_job(self, func, **trigger_args):
+        """Добавление блокирующей задачи с cron-расписанием"""
+        self.scheduler.add_job(self._run_blocking, 'cron', args=[func], **trigger_args)
+
     def schedule_log_maintenance(self):
         """Планирование задач обслуживания логов"""
         # Ежедневная ротация логов в полночь
-        schedule.every().day.at("00:00").do(self.log_manager.rotate_logs)
+        self._add_job(self.log_manager.rotate_logs, hour=0, minute=0)
         
         # Еженедельная очистка старых логов в воскресенье
-        schedule.every().sunday.at("01:00").do(self.log_manager.clean_old_logs)
+        self._add_job(self.log_manager.clean_old_logs, day_of_week='sun', hour=1, minute=0)
         
         # Ежемесячная архивация логов
-        schedule.every().month.at("02:00").do(self.log_manager.archive_logs)
+        self._add_job(self.log_manager.archive_logs, day=1, hour=2, minute=0)
         
         self.logger.info("Задачи обслуживания логов запланированы")
 
     def schedule_db_maintenance(self):
         """Планирование задач обслуживания БД"""
         # Еженедельная очистка БД в воскресенье
-        schedule.every().sunday.at("03:00").do(self.db_cleaner.clean_all)
+        self._add_job(self.db_cleaner.clean_all, day_of_week='sun', hour=3, minute=0)
         
         self.logger.info("Задачи обслуживания БД запланированы")
 
-    def run(self):
-        """Запуск планировщика"""
+    def start(self):
+        """Запуск планировщика в текущем цикле событий"""
         self.schedule_log_maintenance()
         self.schedule_db_maintenance()
-        
-        while True:
-            try:
-                schedule.run_pending()
-                time.sleep(60)
-            except Exception as e:
-                self.logger.error(f"Ошибка в планировщике: {str(e)}")
-                time.sleep(300)  # Пауза 5 минут при ошибке
+        self.scheduler.start()
+
+    async def _serve(self):
+        """Работа планировщика до остановки процесса"""
+        self.start()
+        await asyncio.Event().wait()
+
+    def run(self):
+        """Запуск планировщика"""
+        try:
+            asyncio.run(self._serve())
+        except (KeyboardInterrupt, SystemExit):
+            self.logger.info("Планировщик остановлен")
 
 if __name__ == "__main__":
     scheduler = TaskScheduler()
-    scheduler.run() 
\ No newline at end of file
+    scheduler.run()
@@ -1,7 +1,19 @@
-from typing import Tuple, Optional, Dict, Any
+from typing import Tuple, Optional, Dict, Any, Callable, Iterable, List
+import functools
 import re
+import sys
 from logger import logger
 
+try:
+    import re2
+except ImportError:  # Необязательная зависимость (google-re2): без неё используется re
+    re2 = None
+
+# Управляющие символы, запрещенные в сообщениях (кроме \t, \n и \r); при проверке удаляются из байтов через bytes.translate
+_BAD_ORDS = bytes(range(0, 9)) + bytes(range(0x0B, 0x0D)) + bytes(range(0x0E, 0x20)) + b'\x7f'
+# Таблица удаления тех же символов из строки для sanitize_message
+_DELETE_TBL = str.maketrans('', '', ''.join(chr(b) for b in _BAD_ORDS))
+
 class MessageValidator:
     """
     Валидатор сообщений с настраиваемыми правилами
@@ -17,11 +29,17 @@ class MessageValidator:
         
         # Паттерны для проверки
         self.patterns = {
-            'api_key': r'^sk-[a-zA-Z0-9-]{30,}$',  # Формат API-ключа
-            'command': r'^/[a-zA-Z0-9_]+(?:\s+\S+)*$',  # Формат команды с опциональными параметрами
-            'special_chars': r'[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F]',  # Спец. символы
+            'api_key': r'sk-[a-zA-Z0-9-]{30,}',  # Формат API-ключа
+            'command': r'/[a-zA-Z0-9_]+(?:\s+\S+)*',  # Формат команды с опциональными параметрами
         }
         
+        # Скомпилированные паттерны: проверяются целиком через fullmatch, все классы символов ASCII.
+        # При наличии RE2 используется его линейный по времени движок (классы пробельных символов в RE2 всегда ASCII)
+        if re2 is not None:
+            self._compiled = {name: re2.compile(pattern) for name, pattern in self.patterns.items()}
+        else:
+            self._compiled = {name: re.compile(pattern, re.ASCII) for name, pattern in self.patterns.items()}
+        
         # Правила для разных типов сообщений
         self.rules = {
             'default': {
@@ -29,19 +47,28 @@ class MessageValidator:
                 'min_length': self.limits['min_length'],
                 'allow_commands': True,
                 'allow_special_chars': False,
+                'sanitize': True,
             },
             'command': {
                 'max_length': self.limits['command_length'],
                 'min_length': 1,
-                'pattern': self.patterns['command'],
+                'pattern': self._compiled['command'],
+                'pattern_error': "Неверный формат команды",
+                # Быстрые проверки до регулярного выражения: минимальная длина и префикс
+                '_min_len': 2,
+                '_prefix': '/',
             },
             'api_key': {
-                'pattern': self.patterns['api_key'],
+                'pattern': self._compiled['api_key'],
+                'pattern_error': "Неверный формат API-ключа",
                 'strip': True,
+                '_min_len': 33,
+                '_prefix': 'sk-',
             }
         }
         
-        logger.info("Валидатор сообщений инициализирован")
+        # Специализированные функции проверки для каждого типа сообщений
+        self._dispatch = {msg_type: self._make_validator(rules) for msg_type, rules in self.rules.items()}
     
     def validate_message(self, text: str, msg_type: str = 'default') -> Tuple[bool, Optional[str]]:
         """
@@ -54,37 +81,106 @@ class MessageValidator:
         Returns:
             Tuple[bool, Optional[str]]: (валидно ли, причина ошибки)
         """
-        if not text:
-            return False, "Пустое сообщение"
+        validate = self._dispatch.get(msg_type, self._dispatch['default'])
+        return validate(text)
+    
+    def validate_messages(self, texts: Iterable[str], msg_type: str = 'default') -> List[Tuple[bool, Optional[str]]]:
+        """
+        Пакетная проверка нескольких сообщений одного типа
+        
+        Args:
+            texts (Iterable[str]): Тексты для проверки
+            msg_type (str): Тип сообщений ('default', 'command', 'api_key')
             
-        # Получаем правила для типа сообщения
-        rules = self.rules.get(msg_type, self.rules['default'])
+        Returns:
+            List[Tuple[bool, Optional[str]]]: Результаты проверки в порядке входных текстов
+        """
+        # Функция проверки выбирается один раз, обход выполняется через map без лишних вызовов методов
+        validate = self._dispatch.get(msg_type, self._dispatch['default'])
+        return list(map(validate, texts))
+    
+    def _make_validator(self, rules: Dict[str, Any]) -> Callable[[str], Tuple[bool, Optional[str]]]:
+        """
+        Создание специализированной функции проверки для одного типа сообщений
         
-        # Очищаем текст, если нужно
-        if rules.get('strip', False):
-            text = text.strip()
+        Args:
+            rules (Dict[str, Any]): Правила для типа сообщения
+            
+        Returns:
+            Callable[[str], Tuple[bool, Optional[str]]]: Функция проверки текста
+        """
+        # Все параметры правил разрешаются один раз и захватываются замыканием как локальные переменные
+        strip = rules.get('strip', False)
+        # Допустимый диапазон длины проверяется одним цепочечным сравнением (без проверок на None)
+        max_length = rules.get('max_length')
+        min_length = rules.get('min_length', 0)
+        length_limit = max_length if max_length is not None else sys.maxsize
+        # Тексты ошибок постоянны для правила и формируются один раз
+        too_short_error = f"Сообщение слишком короткое (минимум {min_length} символов)"
+        too_long_error = f"Сообщение слишком длинное (максимум {max_length} символов)"
+        pattern = rules.get('pattern')
+        pattern_error = rules.get('pattern_error', "Сообщение содержит недопустимые символы")
+        prefix_min_len = rules.get('_min_len', 0)
+        prefix = rules.get('_prefix', '')
+        check_special_chars = not rules.get('allow_special_chars', True)
+        bad_ords = _BAD_ORDS
+        
+        def validate(text: str) -> Tuple[bool, Optional[str]]:
+            if not text:
+                return False, "Пустое сообщение"
+            
+            # Очищаем текст, если нужно
+            if strip:
+                text = text.strip()
+            
+            # Проверяем длину; причину ошибки уточняем только при выходе из диапазона
+            length = len(text)
+            if not min_length <= length <= length_limit:
+                if length < min_length:
+                    return False, too_short_error
+                return False, too_long_error
+            
+            # Проверяем паттерн; заведомо неподходящий текст отсекаем по длине и префиксу без регулярного выражения
+            if pattern is not None:
+                if length < prefix_min_len or not text.startswith(prefix):
+                    return False, pattern_error
+                if not pattern.fullmatch(text):
+                    return False, pattern_error
+            
+            # Проверяем специальные символы; все запрещенные символы непечатные, поэтому печатный текст
+            # (в том числе кириллица) принимается сразу. Остальной текст проверяется в байтах: в UTF-8
+            # управляющие символы кодируются сами собой, а bytes.translate удаляет их по битовой маске
+            if check_special_chars and not text.isprintable():
+                encoded = text.encode('utf-8', 'surrogatepass')
+                if len(encoded.translate(None, bad_ords)) != len(encoded):
+                    return False, "Сообщение содержит недопустимые специальные символы"
+            
+            return True, None
+        
+        return validate
+    
+    def validate_and_sanitize(self, text: str, msg_type: str = 'default') -> Tuple[bool, Optional[str], str]:
+        """
+        Проверка и очистка сообщения за один вызов
         
-        # Проверяем длину
-        if 'max_length' in rules and len(text) > rules['max_length']:
-            return False, f"Сообщение слишком длинное (максимум {rules['max_length']} символов)"
+        Args:
+            text (str): Текст для проверки
+            msg_type (str): Тип сообщения ('default', 'command', 'api_key')
             
-        if 'min_length' in rules and len(text) < rules['min_length']:
-            return False, f"Сообщение слишком короткое (минимум {rules['min_length']} символов)"
-        
-        # Проверяем паттерн
-        if 'pattern' in rules and not re.match(rules['pattern'], text):
-            if msg_type == 'command':
-                return False, "Неверный формат команды"
-            elif msg_type == 'api_key':
-                return False, "Неверный формат API-ключа"
-            else:
-                return False, "Сообщение содержит недопустимые символы"
-        
-        # Проверяем специальные символы
-        if not rules.get('allow_special_chars', True) and re.search(self.patterns['special_chars'], text):
-            return False, "Сообщение содержит недопустимые специальные символы"
-        
-        return True, None
+        Returns:
+            Tuple[bool, Optional[str], str]: (валидно ли, причина ошибки, очищенный текст)
+        """
+        is_valid, error_reason = self._dispatch.get(msg_type, self._dispatch['default'])(text)
+        if not is_valid:
+            return False, error_reason, text
+        
+        # Валидный текст уже не содержит спец. символов и укладывается в лимит длины,
+        # поэтому от очистки остается только обрезка пробелов по краям
+        rules = self.rules.get(msg_type, self.rules['default'])
+        if rules.get('sanitize', False) and (text[0].isspace() or text[-1].isspace()):
+            text = text.strip()
+        
+        return True, None, text
     
     def validate_command(self, command: str) -> Tuple[bool, Optional[str]]:
         """
@@ -120,14 +216,39 @@ class MessageValidator:
         Returns:
             str: Очищенный текст
         """
-        # Удаляем специальные символы
-        text = re.sub(self.patterns['special_chars'], '', text)
+        # Удаляем специальные символы; в печатном тексте их нет, и копия строки не создается
+        if not text.isprintable():
+            text = text.translate(_DELETE_TBL)
         
         # Обрезаем до максимальной длины
         if len(text) > self.limits['text_length']:
             text = text[:self.limits['text_length']]
         
-        return text.strip()
+        # Обрезаем пробелы только если они есть по краям, иначе лишняя копия строки не создается
+        if text and (text[0].isspace() or text[-1].isspace()):
+            text = text.strip()
+        
+        return text
+
+# Таблицы экранирования: перед каждым специальным символом ставится обратная косая черта за один проход
+_MD_V2_TABLE = str.maketrans({
+    char: f'\\{char}'
+    for char in ['_', '*', '`', '[', ']', '(', ')', '~', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+})
+# Базовый Markdown: специальных символов мало, поэтому одна замена регулярным выражением быстрее таблицы
+_BASIC_MD_RE = re.compile(r'([_*`\[\]])')
+
+# Кэшируются только короткие строки (подписи кнопок, справка, сообщения об ошибках); длинные разовые тексты экранируются напрямую
+_MD_CACHE_MAX_TEXT_LENGTH = 512
+_MD_CACHE_SIZE = 1024
+
+@functools.lru_cache(maxsize=_MD_CACHE_SIZE)
+def _escape_markdown_v2_cached(text: str) -> str:
+    return text.translate(_MD_V2_TABLE)
+
+@functools.lru_cache(maxsize=_MD_CACHE_SIZE)
+def _escape_markdown_basic_cached(text: str) -> str:
+    return _BASIC_MD_RE.sub(r'\\\1', text)
 
 def escape_markdown(text: str) -> str:
     """
@@ -136,15 +257,10 @@ def escape_markdown(text: str) -> str:
     """
     if not text:
         return text
-        
-    # Специальные символы, которые нужно экранировать
-    special_chars = ['_', '*', '`', '[', ']', '(', ')', '~', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
     
-    escaped_text = text
-    for char in special_chars:
-        escaped_text = escaped_text.replace(char, f'\\{char}')
-        
-    return escaped_text
+    if len(text) > _MD_CACHE_MAX_TEXT_LENGTH:
+        return text.translate(_MD_V2_TABLE)
+    return _escape_markdown_v2_cached(text)
 
 def format_markdown_message(text: str, parse_mode: str = 'MarkdownV2') -> str:
     """
@@ -161,12 +277,27 @@ def format_markdown_message(text: str, parse_mode: str = 'MarkdownV2') -> str:
         return escape_markdown(text)
     
     # Для обычного Markdown экранируем только базовые символы
-    basic_chars = ['_', '*', '`', '[', ']']
-    escaped_text = text
-    for char in basic_chars:
-        escaped_text = escaped_text.replace(char, f'\\{char}')
+    if not text:
+        return text
     
-    return escaped_text
+    if len(text) > _MD_CACHE_MAX_TEXT_LENGTH:
+        return _BASIC_MD_RE.sub(r'\\\1', text)
+    return _escape_markdown_basic_cached(text)
 
-# Создаем глобальный экземпляр валидатора
-validator = MessageValidator()
\ No newline at end of file
+def __getattr__(name: str) -> Any:
+    """
+    Ленивое создание глобального экземпляра валидатора при первом обращении (PEP 562)
+    
+    Args:
+        name (str): Имя запрашиваемого атрибута модуля
+        
+    Returns:
+        Any: Глобальный экземпляр валидатора
+    """
+    if name == 'validator':
+        # После создания экземпляр становится обычной глобальной переменной, и __getattr__ больше не вызывается
+        global validator
+        validator = MessageValidator()
+        logger.info("Валидатор сообщений инициализирован")
+        return validator
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")